@@ -3,8 +3,102 @@ import sys
 import shutil
 import subprocess
 import argparse
+import glob
+import hashlib
 import platform
+import re
 import time
+import threading
+import functools
+import importlib.metadata
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+from build_utils import clear_readonly_and_retry, rmtree
+
+# Run helper tools without allocating a console window per child (Windows only).
+# pip keeps the inherited console so its output stays visible; PyInstaller's
+# output is piped back through the build script.
+_FLAGS = subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0
+
+# Serializes process cleanup (and use of the shared process snapshot) when
+# build/ and dist/ are removed concurrently
+_process_kill_lock = threading.Lock()
+
+# Runtime DLLs that are known to break when UPX-compressed
+UPX_SKIP_PREFIXES = ('vcruntime', 'msvcp', 'ucrtbase', 'api-ms-win', 'python3', 'qt6')
+
+# Stamp of the sources/options the current dist/ output was built from
+BUILD_STAMP_FILE = os.path.join("dist", ".build_stamp")
+
+# Generated PyInstaller spec and the analysis cache PyInstaller keeps next to it
+SPEC_FILE = "GameTimeLimiter.spec"
+ANALYSIS_CACHE_FILE = os.path.join("build", "GameTimeLimiter", "Analysis-00.toc")
+
+REQUIRED_PACKAGES = [
+    'pyinstaller',
+    'PyQt6',
+    'qasync',
+    'openai',
+    'python-dotenv',
+    'pillow',
+    'numpy',
+    'markdown==3.4.3',
+    'python-markdown-math',
+    'psutil==5.9.5',
+    'pygetwindow',
+    'pywin32'
+]
+
+# Hash of the last verified dependency list (lives next to build_fast's cache)
+DEPS_HASH_FILE = os.path.join(".build_cache", "deps.sha")
+
+# pip wheel/HTTP cache kept across builds (cache this path in CI to reuse it)
+PIP_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gametimelimiter-pip")
+
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    Requirement = None
+
+def _normalize_dist_name(name):
+    """Normalize a distribution name for comparison (PEP 503 style)"""
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+def _parse_requirement(package):
+    """Split a requirement string into (name, specifier or None)"""
+    if Requirement is not None:
+        req = Requirement(package)
+        return req.name, (req.specifier if req.specifier else None)
+    return package.split('==')[0], None
+
+def _compile_installed(before):
+    """Byte-compile only the distributions that are new or changed since `before`
+    
+    Failures are reported but never fail the build; uncompiled modules are
+    simply compiled on first import.
+    """
+    files = []
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if not name or before.get(_normalize_dist_name(name)) == dist.version:
+            continue
+        files.extend(str(dist.locate_file(f)) for f in dist.files or () if f.suffix == '.py')
+    
+    if not files:
+        return
+    
+    print(f"Byte-compiling {len(files)} installed files...")
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "compileall", "-q", "-i", "-"],
+            input="\n".join(files), text=True, creationflags=_FLAGS
+        )
+    except OSError as e:
+        print(f"[WARNING] Could not byte-compile installed packages: {e}")
+        return
+    if result.returncode != 0:
+        print("[WARNING] Some installed files could not be byte-compiled")
 
 def check_dependencies():
     """Check and install necessary dependencies"""
@@ -16,44 +110,72 @@ def check_dependencies():
         print("[WARNING] Python 3.10+ recommended for best compatibility")
     elif sys.version_info >= (3, 14):
         print("[WARNING] Python version may be too new, consider using 3.13")
-    required_packages = [
-        'pyinstaller',
-        'PyQt6',
-        'qasync',
-        'openai',
-        'python-dotenv',
-        'pillow',
-        'numpy',
-        'markdown==3.4.3',
-        'python-markdown-math',
-        'psutil==5.9.5',
-        'pygetwindow',
-        'pywin32'
-    ]
     
+    # Skip verification when the requirement list and interpreter are unchanged
+    deps_hash = hashlib.blake2b(
+        repr((sys.executable, sorted(REQUIRED_PACKAGES))).encode()
+    ).hexdigest()
+    try:
+        with open(DEPS_HASH_FILE, 'r', encoding='utf-8') as f:
+            if f.read().strip() == deps_hash:
+                print("[OK] dep cache hit")
+                return
+    except OSError:
+        pass
+    
+    # Scan installed distribution metadata once instead of importing every
+    # package (importing PyQt6/numpy/openai just to probe them is slow)
+    installed = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            installed[_normalize_dist_name(name)] = dist.version
+
     missing_packages = []
-    for package in required_packages:
-        package_name = package.split('==')[0].replace('-', '_').replace('python_', '')
-        if package_name == 'pygetwindow':
-            package_name = 'pygetwindow'
-        elif package_name == 'pillow':
-            package_name = 'PIL'
-        elif package_name == 'PyQt6':
-            package_name = 'PyQt6'
-            
-        try:
-            __import__(package_name)
+    version_mismatch = False
+    for package in REQUIRED_PACKAGES:
+        name, specifier = _parse_requirement(package)
+        version = installed.get(_normalize_dist_name(name))
+
+        if version is None:
+            # Fallback for packages installed without dist-info metadata
+            if importlib.util.find_spec(name.replace('-', '_')) is not None:
+                print(f"[OK] {package} already installed")
+            else:
+                missing_packages.append(package)
+            continue
+
+        if specifier is not None and not specifier.contains(version, prereleases=True):
+            print(f"[WARNING] {name} {version} installed, {package} expected")
+            version_mismatch = True
+        else:
             print(f"[OK] {package} already installed")
-        except ImportError:
-            missing_packages.append(package)
     
     if missing_packages:
         print(f"Installing missing packages: {', '.join(missing_packages)}")
-        for package in missing_packages:
-            print(f"Installing {package}...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package])
+        # One pip invocation for all packages: pip startup and dependency
+        # resolution are paid once instead of once per package
+        env = os.environ.copy()
+        env["PIP_NO_INPUT"] = "1"
+        # Persist the wheel/HTTP cache between builds and skip pip's own
+        # byte-compile; only the newly installed files are compiled afterwards
+        env["PIP_CACHE_DIR"] = PIP_CACHE_DIR
+        subprocess.check_call(
+            [sys.executable, "-m", "pip", "install", "--disable-pip-version-check",
+             "--no-compile", *missing_packages],
+            env=env
+        )
+        _compile_installed(installed)
     else:
         print("[OK] All dependencies are installed")
+    
+    # Keep checking on every build until the installed versions match
+    if version_mismatch:
+        return
+    
+    os.makedirs(os.path.dirname(DEPS_HASH_FILE), exist_ok=True)
+    with open(DEPS_HASH_FILE, 'w', encoding='utf-8') as f:
+        f.write(deps_hash)
 
 def create_env_example():
     """Create .env.example file"""
@@ -65,52 +187,297 @@ def create_env_example():
     else:
         print("[OK] .env.example already exists")
 
-def kill_processes_using_directory(directory):
-    """Kill processes that might be using files in the directory"""
+def _terminate_process(proc):
+    """Terminate a process, ignoring processes that already exited"""
+    try:
+        proc.terminate()
+    except Exception:
+        pass
+
+@functools.lru_cache(maxsize=None)
+def _toolhelp_api():
+    """kernel32 with the prototypes the Toolhelp helpers use (Windows only)
+    
+    Returns (kernel32, PROCESSENTRY32W).
+    """
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESSENTRY32W(ctypes.Structure):
+        _fields_ = [
+            ('dwSize', wintypes.DWORD),
+            ('cntUsage', wintypes.DWORD),
+            ('th32ProcessID', wintypes.DWORD),
+            ('th32DefaultHeapID', ctypes.c_size_t),
+            ('th32ModuleID', wintypes.DWORD),
+            ('cntThreads', wintypes.DWORD),
+            ('th32ParentProcessID', wintypes.DWORD),
+            ('pcPriClassBase', wintypes.LONG),
+            ('dwFlags', wintypes.DWORD),
+            ('szExeFile', wintypes.WCHAR * 260),
+        ]
+    
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    kernel32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+    kernel32.Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    kernel32.Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.QueryFullProcessImageNameW.argtypes = [
+        wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD)
+    ]
+    kernel32.TerminateProcess.argtypes = [wintypes.HANDLE, wintypes.UINT]
+    kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    return kernel32, PROCESSENTRY32W
+
+def _toolhelp_app_pids():
+    """PIDs of running GameTimeLimiter.exe processes from one CreateToolhelp32Snapshot pass"""
+    import ctypes
+    from ctypes import wintypes
+    
+    TH32CS_SNAPPROCESS = 0x00000002
+    INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+    kernel32, PROCESSENTRY32W = _toolhelp_api()
+    
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if snapshot == INVALID_HANDLE_VALUE:
+        raise ctypes.WinError(ctypes.get_last_error())
+    
+    pids = []
+    try:
+        entry = PROCESSENTRY32W()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+        found = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while found:
+            if entry.szExeFile.lower() == 'gametimelimiter.exe':
+                pids.append(entry.th32ProcessID)
+            found = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+    return pids
+
+def _kill_app_processes_toolhelp(target, pids):
+    """Terminate the GameTimeLimiter.exe processes in pids running from target (Windows only)
+    
+    Only these processes are opened to check their image path.
+    Returns the names of the terminated processes.
+    """
+    import ctypes
+    from ctypes import wintypes
+    
+    PROCESS_TERMINATE = 0x0001
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    SYNCHRONIZE = 0x00100000
+    kernel32, _ = _toolhelp_api()
+    
+    # Match whole path components only, so dist does not also match dist2
+    target_prefix = os.path.join(target, '')
+    
+    killed = []
+    handles = []
+    for pid in pids:
+        handle = kernel32.OpenProcess(
+            PROCESS_TERMINATE | PROCESS_QUERY_LIMITED_INFORMATION | SYNCHRONIZE, False, pid
+        )
+        if not handle:
+            continue
+        
+        image = ctypes.create_unicode_buffer(32768)
+        size = wintypes.DWORD(len(image))
+        if (kernel32.QueryFullProcessImageNameW(handle, 0, image, ctypes.byref(size))
+                and os.path.normcase(image.value).startswith(target_prefix)):
+            print(f"Found process using directory: GameTimeLimiter.exe (PID: {pid})")
+            kernel32.TerminateProcess(handle, 1)
+            killed.append('GameTimeLimiter.exe')
+            handles.append(handle)
+        else:
+            kernel32.CloseHandle(handle)
+    
+    # Bounded wait for the terminated processes to exit
+    for handle in handles:
+        kernel32.WaitForSingleObject(handle, 2000)
+        kernel32.CloseHandle(handle)
+    
+    return killed
+
+def _take_process_snapshot():
+    """Walk the process table once for kill_processes_using_directory
+    
+    Returns {'app_pids': [...]} from a Toolhelp snapshot on Windows, or
+    {'processes': [...]} from psutil elsewhere (or if Toolhelp fails);
+    an empty dict if neither is available.
+    """
+    if platform.system() == "Windows":
+        try:
+            return {'app_pids': _toolhelp_app_pids()}
+        except (OSError, AttributeError) as e:
+            print(f"Warning: Toolhelp process scan failed, using psutil: {e}")
+    
+    try:
+        import psutil
+    except ImportError:
+        print("Warning: psutil not available, skipping process cleanup")
+        return {}
+    
+    # ad_value=None: inaccessible attributes come back as None instead of raising
+    return {'processes': list(psutil.process_iter(['pid', 'name', 'exe', 'cmdline'], ad_value=None))}
+
+def kill_processes_using_directory(directory, snapshot=None):
+    """Kill processes that might be using files in the directory
+    
+    Args:
+        directory (str): Directory whose users should be terminated
+        snapshot (dict): Optional result of _take_process_snapshot shared
+            between calls; it is refilled when empty and emptied once
+            processes are terminated, since it no longer matches the
+            process table
+    """
     if not os.path.exists(directory):
         return
     
+    if snapshot is None:
+        snapshot = {}
+    if not snapshot:
+        snapshot.update(_take_process_snapshot())
+        if not snapshot:
+            return False
+    
     print(f"Checking for processes using files in {directory}...")
     killed_processes = []
+    victims = []
+    target = os.path.normcase(os.path.abspath(directory))
+    # Match whole path components only, so dist does not also match dist2
+    target_prefix = os.path.join(target, '')
+    
+    # Windows fast path: only the GameTimeLimiter.exe processes are inspected
+    if 'app_pids' in snapshot:
+        killed_processes = _kill_app_processes_toolhelp(target, snapshot['app_pids'])
+        if killed_processes:
+            snapshot.clear()
+            print(f"Terminated processes: {', '.join(set(killed_processes))}")
+        return len(killed_processes) > 0
     
     try:
-        # Import psutil here to avoid import errors if not installed
-        try:
-            import psutil
-        except ImportError:
-            print("Warning: psutil not available, skipping process cleanup")
-            return False
-            
-        for proc in psutil.process_iter(['pid', 'name', 'exe', 'cmdline']):
+        import psutil
+        
+        for proc in snapshot.get('processes', ()):
             try:
+                info = proc.info
+                
                 # Check if process executable is in the directory
-                if proc.info['exe'] and directory.lower() in proc.info['exe'].lower():
-                    print(f"Found process using directory: {proc.info['name']} (PID: {proc.info['pid']})")
-                    proc.terminate()
-                    killed_processes.append(proc.info['name'])
+                exe = info['exe']
+                if exe and os.path.normcase(exe).startswith(target_prefix):
+                    print(f"Found process using directory: {info['name']} (PID: {info['pid']})")
+                    victims.append(proc)
+                    killed_processes.append(info['name'])
                     continue
                 
                 # Check command line arguments
-                if proc.info['cmdline']:
-                    cmdline = ' '.join(proc.info['cmdline'])
-                    if directory.lower() in cmdline.lower():
-                        print(f"Found process with directory in cmdline: {proc.info['name']} (PID: {proc.info['pid']})")
-                        proc.terminate()
-                        killed_processes.append(proc.info['name'])
+                if any(target_prefix in arg or arg.endswith(target)
+                       for arg in map(os.path.normcase, info['cmdline'] or ())):
+                    print(f"Found process with directory in cmdline: {info['name']} (PID: {info['pid']})")
+                    victims.append(proc)
+                    killed_processes.append(info['name'])
                         
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
                 continue
+        
+        if victims:
+            # The snapshot no longer reflects the process table
+            snapshot.clear()
+            
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(_terminate_process, victims))
+            
+            # Wait only as long as needed, then force kill stragglers
+            gone, alive = psutil.wait_procs(victims, timeout=2)
+            for proc in alive:
+                try:
+                    proc.kill()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
     except Exception as e:
         print(f"Warning: Could not check all processes: {e}")
     
     if killed_processes:
         print(f"Terminated processes: {', '.join(set(killed_processes))}")
-        time.sleep(2)  # Give processes time to terminate
     
     return len(killed_processes) > 0
 
-def safe_rmtree(path, max_retries=5):
-    """Safely remove directory tree with retries for Windows file locking issues"""
+def _schedule_delete_on_reboot(func, path, exc_info):
+    """rmtree error callback: let Windows delete locked entries at next reboot"""
+    if platform.system() == "Windows":
+        import ctypes
+        MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
+        ctypes.windll.kernel32.MoveFileExW(ctypes.c_wchar_p(path), None, MOVEFILE_DELAY_UNTIL_REBOOT)
+
+def _clear_readonly_or_schedule(func, path, exc_info):
+    """rmtree error callback: clear the read-only flag and retry, and only
+    schedule the entry for deletion at reboot if that still fails"""
+    try:
+        clear_readonly_and_retry(func, path, exc_info)
+    except OSError:
+        _schedule_delete_on_reboot(func, path, exc_info)
+
+def _delete_in_background(path):
+    """Remove a directory that was moved out of the way, best effort"""
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_clear_readonly_or_schedule)
+    else:
+        shutil.rmtree(path, onerror=_clear_readonly_or_schedule)
+    
+    if os.path.exists(path):
+        print(f"Warning: Could not completely remove {path}; "
+              "it will be retried on the next build, or delete it manually")
+
+def _start_background_removal(path):
+    """Rename a directory out of the way and delete it on a background thread
+    
+    Returns the deleting thread, or None if the directory does not exist or
+    could not be renamed.
+    """
+    if not os.path.exists(path):
+        return None
+    
+    stale_path = f"{path}.stale.{os.getpid()}"
+    try:
+        os.rename(path, stale_path)
+    except OSError as e:
+        print(f"Could not move {path} aside ({e}), removing in place")
+        return None
+    
+    print(f"Removing directory in background: {path}")
+    thread = threading.Thread(target=_delete_in_background, args=(stale_path,), daemon=True)
+    thread.start()
+    return thread
+
+def _sweep_stale_outputs(names=('build', 'dist')):
+    """Start deleting <name>.stale.* and <name>.old.* left behind by earlier runs
+    
+    Returns the deleting threads.
+    """
+    threads = []
+    for name in names:
+        for leftover in glob.glob(f"{name}.stale.*") + glob.glob(f"{name}.old.*"):
+            if os.path.isdir(leftover):
+                print(f"Removing leftover directory in background: {leftover}")
+                thread = threading.Thread(target=_delete_in_background, args=(leftover,), daemon=True)
+                thread.start()
+                threads.append(thread)
+    return threads
+
+def safe_rmtree(path, max_retries=5, background_threads=None, process_snapshot=None):
+    """Safely remove directory tree with retries for Windows file locking issues
+    
+    process_snapshot is passed through to kill_processes_using_directory so
+    several removals can share one walk of the process table.
+    
+    If the directory has to be moved aside and deleted in the background,
+    the deleting thread is appended to background_threads for the caller to
+    join; without a list it is joined before returning.
+    """
     if not os.path.exists(path):
         return True
     
@@ -118,8 +485,8 @@ def safe_rmtree(path, max_retries=5):
     
     for attempt in range(max_retries):
         try:
-            # First attempt: normal removal
-            shutil.rmtree(path)
+            # Read-only entries are handled by the onerror callback
+            rmtree(path)
             print(f"Successfully removed {path}")
             return True
             
@@ -127,60 +494,40 @@ def safe_rmtree(path, max_retries=5):
             print(f"Attempt {attempt + 1}/{max_retries}: Permission denied - {e}")
             
             if attempt == 0:
-                # First retry: try to kill processes using the directory
-                if kill_processes_using_directory(os.path.abspath(path)):
+                # First retry: try to kill processes using the directory;
+                # one thread at a time scans and terminates processes
+                with _process_kill_lock:
+                    killed = kill_processes_using_directory(os.path.abspath(path), process_snapshot)
+                if killed:
                     print("Killed processes, retrying...")
-                    time.sleep(1)
                     continue
             
-            # Try PowerShell Remove-Item as fallback (Windows-specific)
-            if platform.system() == "Windows" and attempt == 1:
-                try:
-                    print("Trying PowerShell Remove-Item...")
-                    import subprocess
-                    result = subprocess.run([
-                        'powershell', '-Command', 
-                        f'Remove-Item -Path "{path}" -Recurse -Force -ErrorAction SilentlyContinue'
-                    ], capture_output=True, text=True, timeout=30)
-                    
-                    if result.returncode == 0 and not os.path.exists(path):
-                        print(f"Successfully removed {path} using PowerShell")
-                        return True
-                    else:
-                        print("PowerShell removal failed or incomplete")
-                except Exception as ps_e:
-                    print(f"PowerShell removal failed: {ps_e}")
-            
             if attempt < max_retries - 1:
-                # Try to change permissions and retry
-                try:
-                    print("Attempting to change file permissions...")
-                    for root, dirs, files in os.walk(path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            try:
-                                os.chmod(file_path, 0o777)
-                            except:
-                                pass
-                        for dir in dirs:
-                            dir_path = os.path.join(root, dir)
-                            try:
-                                os.chmod(dir_path, 0o777)
-                            except:
-                                pass
-                except:
-                    pass
-                
-                print(f"Waiting {2 * (attempt + 1)} seconds before retry...")
-                time.sleep(2 * (attempt + 1))
-            else:
-                print(f"Failed to remove {path} after {max_retries} attempts")
-                print("You may need to:")
-                print("1. Close any file explorers or editors that might have files open")
-                print("2. Run the build script as administrator")
-                print("3. Manually delete the directory and try again")
-                print("4. Try: Remove-Item -Path \"" + path + "\" -Recurse -Force")
-                return False
+                time.sleep(1)
+                continue
+            
+            # Last resort: move the directory aside and delete it in the background
+            trash_path = f"{path}.old.{os.getpid()}"
+            try:
+                os.rename(path, trash_path)
+                thread = threading.Thread(target=_delete_in_background, args=(trash_path,), daemon=True)
+                thread.start()
+                print(f"Moved {path} aside to {trash_path}, deleting in background")
+                if background_threads is None:
+                    thread.join()
+                else:
+                    background_threads.append(thread)
+                return True
+            except OSError as rename_e:
+                print(f"Could not move {path} aside: {rename_e}")
+            
+            print(f"Failed to remove {path} after {max_retries} attempts")
+            print("You may need to:")
+            print("1. Close any file explorers or editors that might have files open")
+            print("2. Run the build script as administrator")
+            print("3. Manually delete the directory and try again")
+            print("4. Try: Remove-Item -Path \"" + path + "\" -Recurse -Force")
+            return False
                 
         except Exception as e:
             print(f"Attempt {attempt + 1}/{max_retries}: Unexpected error - {e}")
@@ -194,63 +541,162 @@ def safe_rmtree(path, max_retries=5):
 
 def install_upx():
     """Check if UPX is installed, prompt for installation if not found"""
-    try:
-        # Check if UPX is in PATH
-        subprocess.run(['upx', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    # PATH lookup only, no need to start upx.exe to find out
+    if shutil.which('upx') is not None:
         return True
-    except FileNotFoundError:
-        print("UPX compression tool not found, will not use UPX compression.")
-        print("To reduce executable size, install UPX: https://upx.github.io/")
+    
+    print("UPX compression tool not found, will not use UPX compression.")
+    print("To reduce executable size, install UPX: https://upx.github.io/")
+    return False
+
+def _spec_is_current(stamp):
+    """Check that the spec file was generated with the same options and is newer than main.py"""
+    try:
+        with open(SPEC_FILE, 'r', encoding='utf-8') as f:
+            first_line = f.readline().strip()
+        return (first_line == f"# build.py: {stamp}"
+                and os.path.getmtime(SPEC_FILE) >= os.path.getmtime('main.py'))
+    except OSError:
         return False
 
-def build(clean=True, optimize=0):
+def _stamp_spec(stamp):
+    """Record the options the spec file was generated with on its first line"""
+    with open(SPEC_FILE, 'r', encoding='utf-8') as f:
+        content = f.read()
+    with open(SPEC_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"# build.py: {stamp}\n{content}")
+
+def _echo_pyinstaller_output(stream):
+    """Print PyInstaller output, dropping its INFO progress chatter"""
+    for line in stream:
+        if 'INFO:' not in line:
+            print(line, end='')
+
+def _run_pyinstaller(cmd, env):
+    """Run PyInstaller with its output piped through a filtering reader thread"""
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=1,
+        text=True, errors='replace', env=env, creationflags=_FLAGS
+    )
+    reader = threading.Thread(target=_echo_pyinstaller_output, args=(proc.stdout,), daemon=True)
+    reader.start()
+    returncode = proc.wait()
+    reader.join()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def _upx_compress(path):
+    """Compress a single binary with UPX, skipping it on failure"""
+    try:
+        subprocess.check_call(['upx', '-q', '--best', '--lzma', path], creationflags=_FLAGS)
+    except Exception as e:
+        print(f"UPX compression failed for {path}, skipping: {e}")
+
+def _exe_path(optimize):
+    """Path of the executable produced for the given optimization level"""
+    if optimize == 2:
+        return 'dist/GameTimeLimiter/GameTimeLimiter.exe'
+    return 'dist/GameTimeLimiter.exe'
+
+def compute_build_stamp(optimize):
+    """Hash the application sources, dependency list and optimization level"""
+    h = hashlib.blake2b(repr((optimize, REQUIRED_PACKAGES)).encode())
+    sources = ['main.py', 'version.py']
+    for directory in ('logic', 'ui'):
+        sources.extend(sorted(glob.glob(os.path.join(directory, '*.py'))))
+    for source in sources:
+        if os.path.exists(source):
+            h.update(source.encode())
+            with open(source, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def build(clean=True, optimize=0, force=False):
     """Build application
     
     Args:
         clean (bool): Whether to clean old build files
         optimize (int): Optimization level (0=no optimization, 1=light optimization, 2=high optimization)
+        force (bool): Rebuild even if dist/ is up to date
     """
     print("Starting application build...")
     
+    # Skip the whole build when sources and options match the last build
+    stamp = compute_build_stamp(optimize)
+    if not force and os.path.exists(_exe_path(optimize)):
+        try:
+            with open(BUILD_STAMP_FILE, 'r', encoding='utf-8') as f:
+                if f.read().strip() == stamp:
+                    print("[OK] up to date")
+                    return True
+        except OSError:
+            pass
+    
     # Check dependencies
     check_dependencies()
     
     # Create .env.example
     create_env_example()
     
-    # Clean old build files
+    # Clean old build files; directories earlier runs failed to delete go too
+    cleanup_threads = _sweep_stale_outputs()
     if clean:
         print("Cleaning old build files...")
         
-        # Use safe removal for build directory
-        if os.path.exists('build'):
-            if not safe_rmtree('build'):
-                print("Warning: Could not completely remove build directory")
+        # Move old outputs aside and delete them while PyInstaller runs;
+        # fall back to the synchronous safe removal if the rename fails
+        pending = []
+        for directory in ('build', 'dist'):
+            cleanup = _start_background_removal(directory)
+            if cleanup is not None:
+                cleanup_threads.append(cleanup)
+            elif os.path.exists(directory):
+                pending.append(directory)
         
-        # Use safe removal for dist directory
-        if os.path.exists('dist'):
-            if not safe_rmtree('dist'):
-                print("Error: Could not remove dist directory. Build cannot continue.")
-                print("\nTroubleshooting steps:")
-                print("1. Close any file explorers showing the dist folder")
-                print("2. Close any running GameTimeLimiter processes")
-                print("3. Run: python cleanup_processes.py --auto")
-                print("4. Try building again")
-                return False
+        # The two trees are independent, so remove them concurrently
+        removed = {}
+        if pending:
+            # Walk the process table once for both removals
+            process_snapshot = _take_process_snapshot()
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                futures = {
+                    directory: executor.submit(
+                        safe_rmtree, directory,
+                        background_threads=cleanup_threads, process_snapshot=process_snapshot
+                    )
+                    for directory in pending
+                }
+                removed = {directory: future.result() for directory, future in futures.items()}
+        
+        if not removed.get('build', True):
+            print("Warning: Could not completely remove build directory")
+        
+        if not removed.get('dist', True):
+            print("Error: Could not remove dist directory. Build cannot continue.")
+            print("\nTroubleshooting steps:")
+            print("1. Close any file explorers showing the dist folder")
+            print("2. Close any running GameTimeLimiter processes")
+            print("3. Run: python cleanup_processes.py --auto")
+            print("4. Try building again")
+            for thread in cleanup_threads:
+                thread.join()
+            return False
     else:
         print("Keeping old build files...")
     
-    # Basic build command
-    cmd = [
-        'pyinstaller',
+    # Basic spec options
+    spec_options = [
         '--name=GameTimeLimiter',
         '--windowed',
         '--icon=app.ico',
         '--add-data=.env.example;.',
     ]
     
+    # Options that only affect the PyInstaller run, not the generated spec
+    build_options = ['--noconfirm']
+    
     # Necessary hidden imports
-    cmd.extend([
+    spec_options.extend([
         '--hidden-import=win32security',
         '--hidden-import=psutil',
         '--hidden-import=requests',
@@ -272,7 +718,7 @@ def build(clean=True, optimize=0):
     if optimize >= 1:
         print("Applying light optimization...")
         # Use more precise packaging to reduce file size
-        cmd.append('--noupx')  # Don't use UPX for now, will apply manually later
+        spec_options.append('--noupx')  # Don't use UPX for now, will apply manually later
         
         # Exclude some unnecessary modules
         excludes = [
@@ -281,57 +727,90 @@ def build(clean=True, optimize=0):
             'bokeh', 'seaborn', 'jupyter', 'IPython', 'sphinx'
         ]
         
-        for exclude in excludes:
-            cmd.append(f'--exclude-module={exclude}')
+        spec_options.extend(f'--exclude-module={exclude}' for exclude in excludes)
         
         # Single file or directory
         if optimize == 1:
-            cmd.append('--onefile')  # Light optimization uses single file mode
+            spec_options.append('--onefile')  # Light optimization uses single file mode
         else:
-            cmd.append('--onedir')   # High optimization uses directory mode for faster startup
+            spec_options.append('--onedir')   # High optimization uses directory mode for faster startup
+    
+    pyinstaller = ['pyinstaller']
+    makespec = ['pyi-makespec']
     
     if optimize >= 2:
         print("Applying high optimization...")
         # Add advanced optimization options
-        cmd.extend([
-            '--noconfirm',
-            '--clean',
-            '--strip',             # Reduce file size
-            '--log-level=WARN',    # Reduce logging
-        ])
+        spec_options.append('--strip')         # Reduce file size
+        build_options.append('--log-level=WARN')  # Reduce logging
+        if clean:
+            # Incremental (--no-clean) builds keep PyInstaller's analysis cache
+            build_options.append('--clean')
         
         # More precise module exclusions
         precise_excludes = [
             'matplotlib.backends.backend_tkagg', 'matplotlib.backends.backend_wxagg',
             'PIL.ImageDraw', 'PIL.ImageFilter', 'numpy.distutils', 'numpy.f2py',
-            'PyQt6.QtWebEngineCore', 'PyQt6.QtWebEngineWidgets', 'PyQt6.QtMultimedia'
+            'PyQt6.QtWebEngineCore', 'PyQt6.QtWebEngineWidgets', 'PyQt6.QtMultimedia',
+            'test', 'unittest'
         ]
         
-        for exclude in precise_excludes:
-            cmd.append(f'--exclude-module={exclude}')
+        spec_options.extend(f'--exclude-module={exclude}' for exclude in precise_excludes)
+        
+        # Run PyInstaller under -OO so bundled bytecode drops asserts and docstrings
+        pyinstaller = [sys.executable, '-OO', '-m', 'PyInstaller']
+        makespec = [sys.executable, '-OO', '-m', 'PyInstaller.utils.cliutils.makespec']
     
-    # Finally add entry point
-    cmd.append('main.py')
+    env = os.environ.copy()
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
     
     # Execute build
     try:
-        subprocess.check_call(cmd)
+        # Reuse the generated spec while its options and main.py are unchanged
+        spec_stamp = hashlib.blake2b(repr(makespec + spec_options).encode(), digest_size=16).hexdigest()
+        if _spec_is_current(spec_stamp):
+            if os.path.exists(ANALYSIS_CACHE_FILE):
+                print(f"Reusing {SPEC_FILE} with cached analysis")
+            else:
+                print(f"Reusing {SPEC_FILE}")
+        else:
+            print(f"Generating {SPEC_FILE}...")
+            subprocess.check_call(makespec + spec_options + ['main.py'], env=env)
+            _stamp_spec(spec_stamp)
+        
+        _run_pyinstaller(pyinstaller + build_options + [SPEC_FILE], env)
     except subprocess.CalledProcessError as e:
         print(f"Build failed with error: {e}")
+        for thread in cleanup_threads:
+            thread.join()
         return False
     
     # If high optimization is enabled and UPX is found, compress executable
     if optimize >= 2 and install_upx():
-        try:
-            print("Compressing executable with UPX...")
-            if os.path.exists('dist/GameTimeLimiter.exe'):
-                upx_cmd = ['upx', '--best', '--lzma', 'dist/GameTimeLimiter.exe']
-                subprocess.check_call(upx_cmd)
-            elif os.path.exists('dist/GameTimeLimiter/GameTimeLimiter.exe'):
-                upx_cmd = ['upx', '--best', '--lzma', 'dist/GameTimeLimiter/GameTimeLimiter.exe']
-                subprocess.check_call(upx_cmd)
-        except Exception as e:
-            print(f"UPX compression failed, skipping: {e}")
+        print("Compressing executable with UPX...")
+        if os.path.exists('dist/GameTimeLimiter.exe'):
+            targets = ['dist/GameTimeLimiter.exe']
+        elif os.path.exists('dist/GameTimeLimiter/GameTimeLimiter.exe'):
+            # Directory mode: compress the exe and bundled binaries side by side
+            targets = ['dist/GameTimeLimiter/GameTimeLimiter.exe'] + [
+                path for pattern in ('*.dll', '*.pyd')
+                for path in glob.glob(os.path.join('dist/GameTimeLimiter', '**', pattern), recursive=True)
+                if not os.path.basename(path).lower().startswith(UPX_SKIP_PREFIXES)
+            ]
+        else:
+            targets = []
+        
+        # LZMA compression is CPU bound and independent per file
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            list(executor.map(_upx_compress, targets))
+    
+    # Old outputs are normally gone by now; make sure no stale copies remain
+    for thread in cleanup_threads:
+        thread.join()
+    
+    os.makedirs(os.path.dirname(BUILD_STAMP_FILE), exist_ok=True)
+    with open(BUILD_STAMP_FILE, 'w', encoding='utf-8') as f:
+        f.write(stamp)
     
     print("\nBuild completed!")
     
@@ -349,8 +828,9 @@ if __name__ == "__main__":
     parser.add_argument('--no-clean', action='store_true', help='Do not clean old build files')
     parser.add_argument('--optimize', type=int, choices=[0, 1, 2], default=0, 
                         help='Optimization level: 0=no optimization, 1=light optimization, 2=high optimization (faster startup but uses directory structure)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if dist is up to date')
     args = parser.parse_args()
     
-    success = build(clean=not args.no_clean, optimize=args.optimize)
+    success = build(clean=not args.no_clean, optimize=args.optimize, force=args.force)
     if not success:
         sys.exit(1) 
\ No newline at end of file
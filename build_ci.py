@@ -9,103 +9,173 @@ import sys
 import subprocess
 import shutil
 import argparse
+import re
+import threading
 import traceback
+from importlib.metadata import PackageNotFoundError, version
+from importlib.util import find_spec
 
-def check_file_exists(filepath, description):
-    """Check if a file exists and log the result"""
-    if os.path.exists(filepath):
-        size = os.path.getsize(filepath)
+# Modules the build needs; checked with find_spec instead of importing them
+CRITICAL_MODULES = ['PyQt6', 'psutil', 'qasync', 'openai']
+
+# Background deletions started by _async_rmtree
+_cleanup_threads = []
+
+# PyInstaller output lines worth showing; problems take priority over progress
+_PROBLEM_RE = re.compile(
+    rb'error|warning|failed|exception|traceback|module not found|missing module|cannot find'
+)
+_STEP_RE = re.compile(rb'building (?:exe|pyz|pkg|bootloader)')
+
+# Build stages in priority order: (keyword, stage, banner printed once when it starts)
+_STAGES = (
+    (b'analyzing', 'analyzing', "📊 Analyzing dependencies..."),
+    (b'building pyz', 'pyz', "📦 Building Python archive..."),
+    (b'building exe', 'exe', "🔨 Building executable..."),
+)
+
+def _report_output_line(line, build_stage):
+    """Print a PyInstaller output line if it is important, return the current build stage"""
+    lower = line.lower()
+    
+    # Track build stages for progress indication
+    for keyword, stage, banner in _STAGES:
+        if keyword in lower:
+            if stage != build_stage:
+                print(f"[CI BUILD] {banner}")
+                build_stage = stage
+            break
+    
+    # Only show important messages: errors, warnings, and key progress info
+    if _PROBLEM_RE.search(lower):
+        print(f"[PYINSTALLER] ⚠️  {line.rstrip().decode('utf-8', errors='replace')}")
+    elif _STEP_RE.search(lower):
+        print(f"[PYINSTALLER] 🔧 {line.rstrip().decode('utf-8', errors='replace')}")
+    elif b'collecting' in lower and b'qt' in lower:
+        print(f"[PYINSTALLER] 📚 {line.rstrip().decode('utf-8', errors='replace')}")  # Show PyQt collection progress
+    
+    return build_stage
+
+def check_file_exists(filepath, description, entries):
+    """Check if a file exists and log the result
+    
+    entries maps names in the working directory to their os.DirEntry, so
+    the check needs no extra stat calls.
+    """
+    entry = entries.get(filepath)
+    if entry is not None and entry.is_file():
+        size = entry.stat().st_size
         print(f"[CI BUILD] ✓ {description}: {filepath} ({size} bytes)")
         return True
     else:
         print(f"[CI BUILD] ✗ {description}: {filepath} NOT FOUND")
         return False
 
+def _list_dir_contents(entries):
+    """Print every file among entries with its size, recursing into directories"""
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            with os.scandir(entry.path) as it:
+                _list_dir_contents(it)
+        elif entry.is_file():
+            print(f"[CI BUILD]   {entry.path}: {entry.stat().st_size} bytes")
+
+def _async_rmtree(path):
+    """Rename a directory out of the way and delete it in the background"""
+    trash = f"{path}.trash.{os.getpid()}"
+    try:
+        os.rename(path, trash)
+    except OSError:
+        # Rename not possible, fall back to removing it in place
+        shutil.rmtree(path)
+        return
+    
+    if sys.platform == 'win32':
+        # rd /s /q is faster than shutil.rmtree on NTFS
+        subprocess.Popen(
+            ['cmd', '/c', 'rd', '/s', '/q', trash],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            creationflags=subprocess.DETACHED_PROCESS
+        )
+    else:
+        thread = threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={'ignore_errors': True})
+        thread.start()
+        _cleanup_threads.append(thread)
+
+def _wait_for_cleanup():
+    """Wait for background directory removals that are still running"""
+    for thread in _cleanup_threads:
+        if thread.is_alive():
+            thread.join()
+
+_PARSER = argparse.ArgumentParser(description='Build GameTimeLimiter for CI')
+_PARSER.add_argument('--optimize', type=int, default=1, choices=[0, 1],
+                     help='Optimization level (0=none, 1=basic)')
+_PARSER.add_argument('--verbose', action='store_true',
+                     help='Import PyQt6 to report the Qt version')
+
 def main():
-    parser = argparse.ArgumentParser(description='Build GameTimeLimiter for CI')
-    parser.add_argument('--optimize', type=int, default=1, choices=[0, 1],
-                       help='Optimization level (0=none, 1=basic)')
-    args = parser.parse_args()
+    args = _PARSER.parse_args()
     
     print(f"[CI BUILD] Starting build with optimization level {args.optimize}")
     print(f"[CI BUILD] Python version: {sys.version}")
     print(f"[CI BUILD] Working directory: {os.getcwd()}")
     print(f"[CI BUILD] Python executable: {sys.executable}")
     
+    # One scan of the working directory serves all existence checks below
+    with os.scandir('.') as it:
+        entries = {entry.name: entry for entry in it}
+    
     # Check required files exist
     required_files = ['main.py', 'app.ico', 'requirements.txt']
     for file in required_files:
-        if not check_file_exists(file, f"Required file"):
+        if not check_file_exists(file, f"Required file", entries):
             print(f"[CI BUILD] ERROR: Missing required file: {file}")
             return 1
     
     # Check directories
     required_dirs = ['ui', 'logic']
     for dir in required_dirs:
-        if os.path.exists(dir):
-            files = os.listdir(dir)
-            print(f"[CI BUILD] ✓ Directory {dir}: {len(files)} files")
+        entry = entries.get(dir)
+        if entry is not None and entry.is_dir():
+            with os.scandir(entry.path) as it:
+                file_count = sum(1 for _ in it)
+            print(f"[CI BUILD] ✓ Directory {dir}: {file_count} files")
         else:
             print(f"[CI BUILD] ✗ Directory {dir}: NOT FOUND")
             return 1
     
-    # Clean dist directory if it exists
-    if os.path.exists('dist'):
-        print("[CI BUILD] Removing existing dist directory...")
-        try:
-            shutil.rmtree('dist')
-            print("[CI BUILD] ✓ Dist directory removed")
-        except Exception as e:
-            print(f"[CI BUILD] Warning: Could not remove dist directory: {e}")
-    
-    # Clean build directory if it exists
-    if os.path.exists('build'):
-        print("[CI BUILD] Removing existing build directory...")
-        try:
-            shutil.rmtree('build')
-            print("[CI BUILD] ✓ Build directory removed")
-        except Exception as e:
-            print(f"[CI BUILD] Warning: Could not remove build directory: {e}")
+    # Move dist/build aside and delete them in the background so
+    # PyInstaller can start right away
+    for directory in ('dist', 'build'):
+        if directory in entries:
+            print(f"[CI BUILD] Removing existing {directory} directory...")
+            try:
+                _async_rmtree(directory)
+                print(f"[CI BUILD] ✓ {directory.capitalize()} directory cleared")
+            except Exception as e:
+                print(f"[CI BUILD] Warning: Could not remove {directory} directory: {e}")
     
-    # Verify critical imports with detailed error reporting
+    # Verify critical modules are installed without importing them
     print("[CI BUILD] Verifying critical imports...")
-    try:
-        import PyQt6
-        from PyQt6 import QtCore
-        print(f"[CI BUILD] ✓ PyQt6 version: {QtCore.PYQT_VERSION_STR}")
-        print(f"[CI BUILD] ✓ Qt version: {QtCore.QT_VERSION_STR}")
-    except ImportError as e:
-        print(f"[CI BUILD] ✗ PyQt6 import failed: {e}")
-        print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
-        return 1
-    except AttributeError as e:
-        print(f"[CI BUILD] ✗ PyQt6 attribute error: {e}")
-        print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
-        return 1
-    
-    try:
-        import psutil
-        print(f"[CI BUILD] ✓ psutil version: {psutil.__version__}")
-    except ImportError as e:
-        print(f"[CI BUILD] ✗ psutil import failed: {e}")
-        print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
-        return 1
-    
-    try:
-        import qasync
-        print(f"[CI BUILD] ✓ qasync imported successfully")
-    except ImportError as e:
-        print(f"[CI BUILD] ✗ qasync import failed: {e}")
-        print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
-        return 1
+    for module in CRITICAL_MODULES:
+        if find_spec(module) is None:
+            print(f"[CI BUILD] ✗ {module} not found")
+            return 1
+        try:
+            print(f"[CI BUILD] ✓ {module} version: {version(module)}")
+        except PackageNotFoundError:
+            print(f"[CI BUILD] ✓ {module} found")
     
-    try:
-        import openai
-        print(f"[CI BUILD] ✓ openai version: {openai.__version__}")
-    except ImportError as e:
-        print(f"[CI BUILD] ✗ openai import failed: {e}")
-        print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
-        return 1
+    if args.verbose:
+        # Importing Qt loads its DLLs, so only do it when asked for
+        try:
+            from PyQt6 import QtCore
+            print(f"[CI BUILD] ✓ Qt version: {QtCore.QT_VERSION_STR}")
+        except (ImportError, AttributeError) as e:
+            print(f"[CI BUILD] ✗ PyQt6 import failed: {e}")
+            print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
+            return 1
     
     # Build command with size optimization
     cmd = [
@@ -148,47 +218,26 @@ def main():
     print("[CI BUILD] " + "="*50)
     
     try:
-        # Run with real-time output
+        # Run with real-time output (bytes; only matched lines get decoded)
         process = subprocess.Popen(
             cmd, 
             stdout=subprocess.PIPE, 
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            bufsize=0
         )
         
-        # Print output in real-time, filtering for important messages
+        # Print output in real-time, filtering for important messages.
+        # os.read returns whatever is available (up to 64 KiB), so lines are
+        # split out of large blocks instead of one read per line.
         build_stage = ""
-        for line in process.stdout:
-            line = line.rstrip()
-            
-            # Track build stages for progress indication
-            if 'analyzing' in line.lower():
-                if build_stage != "analyzing":
-                    print("[CI BUILD] 📊 Analyzing dependencies...")
-                    build_stage = "analyzing"
-            elif 'building pyz' in line.lower():
-                if build_stage != "pyz":
-                    print("[CI BUILD] 📦 Building Python archive...")
-                    build_stage = "pyz"
-            elif 'building exe' in line.lower():
-                if build_stage != "exe":
-                    print("[CI BUILD] 🔨 Building executable...")
-                    build_stage = "exe"
-            
-            # Only show important messages: errors, warnings, and key progress info
-            if any(keyword in line.lower() for keyword in [
-                'error', 'warning', 'failed', 'exception', 'traceback',
-                'module not found', 'missing module', 'cannot find'
-            ]):
-                print(f"[PYINSTALLER] ⚠️  {line}")
-            elif any(keyword in line.lower() for keyword in [
-                'building exe', 'building pyz', 'building pkg', 'building bootloader'
-            ]):
-                print(f"[PYINSTALLER] 🔧 {line}")
-            elif 'collecting' in line.lower() and ('pyqt' in line.lower() or 'qt' in line.lower()):
-                print(f"[PYINSTALLER] 📚 {line}")  # Show PyQt collection progress
+        pending = b''
+        fd = process.stdout.fileno()
+        while chunk := os.read(fd, 65536):
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                build_stage = _report_output_line(line, build_stage)
+        if pending:
+            build_stage = _report_output_line(pending, build_stage)
         
         process.wait()
         
@@ -204,9 +253,16 @@ def main():
         return 1
     
     # Verify the build
+    # One scan of dist/ finds the exe and serves the debug listing
     exe_path = os.path.join('dist', 'GameTimeLimiter.exe')
-    if os.path.exists(exe_path):
-        size_bytes = os.path.getsize(exe_path)
+    try:
+        with os.scandir('dist') as it:
+            dist_entries = list(it)
+    except FileNotFoundError:
+        dist_entries = None
+    exe_entry = next((e for e in dist_entries or () if e.name == 'GameTimeLimiter.exe'), None)
+    if exe_entry is not None and exe_entry.is_file():
+        size_bytes = exe_entry.stat().st_size
         size_mb = size_bytes / (1024 * 1024)
         print(f"[CI BUILD] ✓ SUCCESS: Built {exe_path}")
         print(f"[CI BUILD] 📊 File size: {size_mb:.1f} MB ({size_bytes:,} bytes)")
@@ -219,27 +275,14 @@ def main():
         elif size_mb < 50:
             print(f"[CI BUILD] ✅ Good file size - well optimized!")
         
-        # List all files in dist
-        print("[CI BUILD] Dist directory contents:")
-        for root, dirs, files in os.walk('dist'):
-            for file in files:
-                filepath = os.path.join(root, file)
-                size = os.path.getsize(filepath)
-                size_mb_file = size / (1024 * 1024)
-                print(f"[CI BUILD]   {filepath}: {size_mb_file:.1f} MB ({size:,} bytes)")
-        
         return 0
     else:
         print(f"[CI BUILD] ✗ ERROR: Expected executable not found at {exe_path}")
         
         # Debug: check what was actually created
-        if os.path.exists('dist'):
+        if dist_entries is not None:
             print("[CI BUILD] Dist directory exists but exe not found. Contents:")
-            for root, dirs, files in os.walk('dist'):
-                for file in files:
-                    filepath = os.path.join(root, file)
-                    size = os.path.getsize(filepath)
-                    print(f"[CI BUILD]   {filepath}: {size} bytes")
+            _list_dir_contents(dist_entries)
         else:
             print("[CI BUILD] Dist directory does not exist")
         
@@ -247,7 +290,9 @@ def main():
 
 if __name__ == '__main__':
     try:
-        sys.exit(main())
+        exit_code = main()
+        _wait_for_cleanup()
+        sys.exit(exit_code)
     except Exception as e:
         print(f"[CI BUILD] FATAL ERROR: {e}")
         print(f"[CI BUILD] Traceback: {traceback.format_exc()}")
@@ -8,124 +8,148 @@ import os
 import sys
 import shutil
 import subprocess
-import argparse
 import time
 import hashlib
-import json
+import pickle
 from pathlib import Path
 
+from build_utils import fast_rmtree, rmtree
+
 # 构建缓存配置
 CACHE_DIR = ".build_cache"
-CACHE_FILE = os.path.join(CACHE_DIR, "build_cache.json")
+CACHE_FILE = os.path.join(CACHE_DIR, "build_cache.pkl")
+SPEC_FILE = "GameTimeLimiter.spec"
+
+# 决定是否需要重新构建的关键文件和目录
+KEY_FILES = ['main.py', 'version.py', 'requirements.txt', 'app.ico']
+KEY_DIRS = ['logic', 'ui']
+
+# UPX压缩会损坏的运行时DLL，交给PyInstaller时排除
+UPX_EXCLUDES = [
+    'vcruntime140.dll',
+    'vcruntime140_1.dll',
+    'msvcp140.dll',
+    'ucrtbase.dll',
+    'python3.dll',
+    f'python3{sys.version_info.minor}.dll',
+]
 
 def get_file_hash(filepath):
-    """获取文件的MD5哈希值"""
-    if not os.path.exists(filepath):
+    """获取文件的变更标识（修改时间+大小），无需读取文件内容"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
         return None
-    
-    hash_md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+# 扫描目录时跳过的子目录
+SKIP_DIRS = {'__pycache__', 'build', 'dist'}
+
+def _scan(directory, extensions):
+    """递归扫描目录，按名称顺序逐个目录产出匹配扩展名的文件条目"""
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            # 跳过缓存目录和其他不需要的目录
+            if not entry.name.startswith('.') and entry.name not in SKIP_DIRS:
+                yield from _scan(entry.path, extensions)
+        elif entry.is_file(follow_symlinks=False) and entry.name.endswith(extensions):
+            yield entry
 
 def get_directory_hash(directory, extensions=None):
     """获取目录中所有文件的哈希值"""
     if extensions is None:
         extensions = ['.py', '.ui', '.qrc', '.ico', '.png', '.jpg', '.txt', '.md']
     
-    all_hashes = []
-    for root, dirs, files in os.walk(directory):
-        # 跳过缓存目录和其他不需要的目录
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'build', 'dist']]
-        
-        for file in sorted(files):
-            if any(file.endswith(ext) for ext in extensions):
-                filepath = os.path.join(root, file)
-                file_hash = get_file_hash(filepath)
-                if file_hash:
-                    all_hashes.append(f"{filepath}:{file_hash}")
-    
-    # 计算所有文件哈希的总哈希
-    combined = "|".join(all_hashes)
-    return hashlib.md5(combined.encode()).hexdigest()
+    hasher = hashlib.blake2b(digest_size=16)
+    for entry in _scan(directory, tuple(extensions)):
+        # DirEntry.stat() 复用目录扫描时获取的信息
+        st = entry.stat(follow_symlinks=False)
+        hasher.update(f"{entry.path}:{st.st_mtime_ns}:{st.st_size}|".encode())
+    return hasher.hexdigest()
 
 def load_build_cache():
     """加载构建缓存"""
-    if not os.path.exists(CACHE_FILE):
-        return {}
-    
     try:
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
+        with open(CACHE_FILE, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # 缓存不存在或已损坏，当作无缓存处理
         return {}
 
 def save_build_cache(cache_data):
-    """保存构建缓存"""
+    """保存构建缓存（先写临时文件再替换，中断时不会留下损坏的缓存）"""
     os.makedirs(CACHE_DIR, exist_ok=True)
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, indent=2)
+    tmp_file = CACHE_FILE + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(cache_data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, CACHE_FILE)
 
-def check_if_rebuild_needed():
-    """检查是否需要重新构建"""
-    print("🔍 检查是否需要重新构建...")
-    
-    # 加载缓存
-    cache = load_build_cache()
-    
-    # 检查关键文件
-    key_files = [
-        'main.py',
-        'version.py',
-        'requirements.txt',
-        'app.ico'
-    ]
-    
-    # 检查关键目录
-    key_dirs = ['logic', 'ui']
-    
+def get_current_hashes():
+    """计算所有关键文件和目录的当前哈希"""
     current_hashes = {}
-    
-    # 检查关键文件
-    for file in key_files:
+    for file in KEY_FILES:
         if os.path.exists(file):
             current_hashes[file] = get_file_hash(file)
-    
-    # 检查关键目录
-    for dir in key_dirs:
+    for dir in KEY_DIRS:
         if os.path.exists(dir):
             current_hashes[dir] = get_directory_hash(dir)
+    return current_hashes
+
+def check_if_rebuild_needed():
+    """检查是否需要重新构建"""
+    print("🔍 检查是否需要重新构建...")
     
-    # 检查可执行文件是否存在
+    # 先检查可执行文件是否存在（一次stat），不存在则无需计算任何哈希
     exe_exists = (
         os.path.exists('dist/GameTimeLimiter.exe') or 
         os.path.exists('dist/GameTimeLimiter/GameTimeLimiter.exe')
     )
-    
-    # 比较哈希值
-    cached_hashes = cache.get('file_hashes', {})
-    
     if not exe_exists:
         print("❌ 可执行文件不存在，需要完整构建")
-        return True, current_hashes
-    
-    for key, current_hash in current_hashes.items():
-        cached_hash = cached_hashes.get(key)
-        if cached_hash != current_hash:
+        return True
+    
+    # 逐个比较哈希值，遇到第一个变化即返回
+    cached_hashes = load_build_cache().get('file_hashes', {})
+    for key in KEY_FILES + KEY_DIRS:
+        if not os.path.exists(key):
+            current_hash = None
+        elif key in KEY_DIRS:
+            current_hash = get_directory_hash(key)
+        else:
+            current_hash = get_file_hash(key)
+        if cached_hashes.get(key) != current_hash:
             print(f"📝 文件/目录已更改: {key}")
-            return True, current_hashes
+            return True
     
     print("✅ 无需重新构建，使用现有可执行文件")
-    return False, current_hashes
+    return False
+
+def spec_is_current(stamp):
+    """检查spec文件是否由相同选项生成且比main.py新"""
+    try:
+        with open(SPEC_FILE, 'r', encoding='utf-8') as f:
+            first_line = f.readline().strip()
+        return (first_line == f"# build_fast.py: {stamp}"
+                and os.path.getmtime(SPEC_FILE) >= os.path.getmtime('main.py'))
+    except OSError:
+        return False
+
+def stamp_spec(stamp):
+    """在spec文件首行记录生成它的选项哈希"""
+    with open(SPEC_FILE, 'r', encoding='utf-8') as f:
+        content = f.read()
+    with open(SPEC_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"# build_fast.py: {stamp}\n{content}")
 
 def quick_clean():
     """快速清理 - 只清理必要的文件"""
     print("🧹 快速清理构建文件...")
     
-    # 只清理spec文件和部分构建文件
+    # 只清理多余的spec文件（GameTimeLimiter.spec 会被复用）
     files_to_remove = [
-        'GameTimeLimiter.spec',
         'main.spec'
     ]
     
@@ -141,36 +165,22 @@ def fast_build(force_rebuild=False, use_cache=True):
     
     # 检查是否需要重新构建
     if use_cache and not force_rebuild:
-        needs_rebuild, current_hashes = check_if_rebuild_needed()
-        if not needs_rebuild:
+        if not check_if_rebuild_needed():
             print(f"⚡ 构建跳过，耗时: {time.time() - start_time:.2f} 秒")
             return True
-    else:
-        # 强制重建时获取当前哈希
-        current_hashes = {}
-        key_files = ['main.py', 'version.py', 'requirements.txt', 'app.ico']
-        key_dirs = ['logic', 'ui']
-        
-        for file in key_files:
-            if os.path.exists(file):
-                current_hashes[file] = get_file_hash(file)
-        
-        for dir in key_dirs:
-            if os.path.exists(dir):
-                current_hashes[dir] = get_directory_hash(dir)
+    
+    # 构建前记录当前哈希，构建成功后写入缓存
+    current_hashes = get_current_hashes() if use_cache else {}
     
     # 快速清理
     quick_clean()
     
-    # 构建命令 - 优化版本
-    cmd = [
-        'pyinstaller',
+    # spec 选项 - 优化版本（写入 GameTimeLimiter.spec）
+    spec_options = [
         '--name=GameTimeLimiter',
         '--windowed',
         '--icon=app.ico',
         '--add-data=.env.example;.',
-        '--noconfirm',  # 不询问覆盖
-        '--clean',      # 清理临时文件
         '--onefile',    # 单文件模式，启动稍慢但分发方便
         
         # 关键优化：减少不必要的模块
@@ -194,25 +204,52 @@ def fast_build(force_rebuild=False, use_cache=True):
         '--hidden-import=requests',
         '--hidden-import=urllib3',
         '--hidden-import=certifi',
-        
-        # 减少日志输出
-        '--log-level=WARN',
-        
-        # 入口点
-        'main.py'
     ]
     
+    # 找到UPX时由PyInstaller在打包过程中压缩，排除易损坏的运行时DLL
+    upx = shutil.which('upx')
+    if upx:
+        spec_options.extend(f'--upx-exclude={name}' for name in UPX_EXCLUDES)
+    
+    # 生成 spec 文件（选项或 main.py 变化时才重新生成）
+    spec_stamp = hashlib.blake2b(repr(spec_options).encode(), digest_size=16).hexdigest()
+    if spec_is_current(spec_stamp):
+        print(f"📄 复用 {SPEC_FILE}")
+    else:
+        print(f"📄 生成 {SPEC_FILE}...")
+        result = subprocess.run(['pyi-makespec', *spec_options, 'main.py'], capture_output=True, text=True)
+        if result.returncode != 0:
+            print("❌ 生成spec失败:")
+            print(result.stderr)
+            return False
+        stamp_spec(spec_stamp)
+    
+    # 构建命令 - 不使用 --clean，复用 build/ 中的分析缓存
+    cmd = [
+        'pyinstaller',
+        '--noconfirm',  # 不询问覆盖
+        '--log-level=WARN',  # 减少日志输出
+        SPEC_FILE
+    ]
+    env = None
+    if upx:
+        cmd[1:1] = ['--upx-dir', os.path.dirname(upx)]
+        env = {**os.environ, 'UPX': '--best --lzma'}  # UPX从环境变量读取默认选项
+        print(f"🗜️ 使用UPX压缩: {upx}")
+    
     print("🔨 执行PyInstaller构建...")
     try:
-        # 使用较少的输出来加速
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
+        # 丢弃stdout，只收集stderr（--log-level=WARN 下只有警告和错误）
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   text=True, env=env)
+        _, stderr = process.communicate()
+        if process.returncode != 0:
             print("❌ 构建失败:")
-            print(result.stderr)
+            print(stderr)
             return False
         else:
             print("✅ PyInstaller构建完成")
-    except subprocess.CalledProcessError as e:
+    except OSError as e:
         print(f"❌ 构建失败: {e}")
         return False
     
@@ -244,7 +281,11 @@ def clean_all():
     
     for dir_name in dirs_to_remove:
         if os.path.exists(dir_name):
-            shutil.rmtree(dir_name)
+            if not fast_rmtree(dir_name):
+                try:
+                    rmtree(dir_name)
+                except OSError as e:
+                    print(f"⚠️ 删除目录失败: {dir_name} ({e})")
             print(f"   删除目录: {dir_name}")
     
     for file_name in files_to_remove:
@@ -273,28 +314,42 @@ def show_cache_info():
         for file, hash_val in cache['file_hashes'].items():
             print(f"     {file}: {hash_val[:8]}...")
 
+# 命令行参数及其帮助信息
+FLAGS = {
+    '--force': '强制重新构建，忽略缓存',
+    '--no-cache': '不使用缓存机制',
+    '--clean': '完全清理所有构建文件和缓存',
+    '--cache-info': '显示缓存信息',
+}
+
+def parse_flags(argv):
+    """解析命令行开关；只有出现其他参数（如 -h、缩写）时才导入argparse"""
+    flags = set(argv)
+    if flags <= FLAGS.keys():
+        return flags
+    import argparse
+    parser = argparse.ArgumentParser(description='GameTimeLimiter 快速构建工具')
+    for flag, help_text in FLAGS.items():
+        parser.add_argument(flag, action='store_true', help=help_text)
+    args = vars(parser.parse_args(argv))  # -h 或错误参数时在此退出
+    return {flag for flag in FLAGS if args[flag[2:].replace('-', '_')]}
+
 def main():
     """主函数"""
-    parser = argparse.ArgumentParser(description='GameTimeLimiter 快速构建工具')
-    parser.add_argument('--force', action='store_true', help='强制重新构建，忽略缓存')
-    parser.add_argument('--no-cache', action='store_true', help='不使用缓存机制')
-    parser.add_argument('--clean', action='store_true', help='完全清理所有构建文件和缓存')
-    parser.add_argument('--cache-info', action='store_true', help='显示缓存信息')
-    
-    args = parser.parse_args()
+    flags = parse_flags(sys.argv[1:])
     
-    if args.cache_info:
+    if '--cache-info' in flags:
         show_cache_info()
         return
     
-    if args.clean:
+    if '--clean' in flags:
         clean_all()
         return
     
     # 执行快速构建
     success = fast_build(
-        force_rebuild=args.force,
-        use_cache=not args.no_cache
+        force_rebuild='--force' in flags,
+        use_cache='--no-cache' not in flags
     )
     
     if not success:
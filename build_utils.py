@@ -0,0 +1,43 @@
+"""
+Directory removal helpers shared by the build and cleanup scripts
+"""
+
+import os
+import sys
+import stat
+import shutil
+import subprocess
+
+
+def clear_readonly_and_retry(func, path, exc_info):
+    """rmtree error callback: clear the read-only flag on the failing entry and retry it"""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def rmtree(path):
+    """shutil.rmtree that fixes read-only entries inline instead of a separate walk
+
+    Raises the same exceptions as shutil.rmtree when an entry still cannot be removed.
+    """
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=clear_readonly_and_retry)
+    else:
+        shutil.rmtree(path, onerror=clear_readonly_and_retry)
+
+
+def fast_rmtree(path):
+    """Remove a directory with rd /s /q or rm -rf, return True if it is gone
+
+    Native tools are much faster than shutil.rmtree on large trees. Nothing is
+    raised; callers fall back to rmtree() when this returns False.
+    """
+    if sys.platform == 'win32':
+        cmd = ['cmd', '/c', 'rd', '/s', '/q', path]
+    else:
+        cmd = ['rm', '-rf', path]
+    try:
+        subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    return not os.path.exists(path)
@@ -5,11 +5,14 @@ Cleans up processes and directories that might interfere with building
 """
 
 import os
+import re
 import sys
 import time
-import shutil
 import psutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from build_utils import fast_rmtree, rmtree
 
 # Setup logging
 logging.basicConfig(
@@ -18,56 +21,92 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Directories produced by PyInstaller
+BUILD_DIRS = ['build', 'dist']
+
+# Matches any build dir name in one pass instead of one substring scan per dir;
+# bytes so it can run directly on the raw command line
+_BUILD_DIR_RE = re.compile(b'|'.join(re.escape(os.fsencode(d)) for d in BUILD_DIRS))
+
+def _get_attr(getter):
+    """Call a psutil.Process getter, returning None if access is denied"""
+    try:
+        return getter()
+    except psutil.AccessDenied:
+        return None
+
+def _raw_cmdline(proc):
+    """Return the command line as bytes, or None if it cannot be read
+    
+    On Linux /proc/<pid>/cmdline is read as-is, skipping psutil's split
+    into a list that would only be joined back together.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open(f'/proc/{proc.pid}/cmdline', 'rb') as f:
+                return f.read().replace(b'\0', b' ')
+        except FileNotFoundError:
+            raise psutil.NoSuchProcess(proc.pid)
+        except PermissionError:
+            return None
+    cmdline = _get_attr(proc.cmdline)
+    return os.fsencode(' '.join(cmdline)) if cmdline else None
+
+def _kill_reason(proc, name, workspace_bytes, build_paths):
+    """Return why proc should be killed, or None
+    
+    The name is checked first; exe, cwd and cmdline are only read in one
+    oneshot() batch for processes the name check did not already match.
+    """
+    if name and 'GameTimeLimiter' in name:
+        return "GameTimeLimiter executable"
+    
+    with proc.oneshot():
+        exe = _get_attr(proc.exe)
+        proc_cwd = _get_attr(proc.cwd)
+        cmdline = _raw_cmdline(proc)
+    
+    # Check if process executable is in build directories
+    if exe:
+        exe = os.path.normcase(exe)
+        build_dir = next((bd for bd, path in build_paths if exe.startswith(path)), None)
+        if build_dir:
+            return f"executable in {build_dir} directory"
+    
+    # Check if process working directory is in build directories
+    if proc_cwd:
+        proc_cwd = os.path.join(os.path.normcase(proc_cwd), '')
+        build_dir = next((bd for bd, path in build_paths if proc_cwd.startswith(path)), None)
+        if build_dir:
+            return f"working directory in {build_dir}"
+    
+    # Check command line for build directory references
+    if cmdline and workspace_bytes in os.path.normcase(cmdline):
+        match = _BUILD_DIR_RE.search(cmdline)
+        if match:
+            return f"command line references {match.group().decode()}"
+    
+    return None
+
 def find_and_kill_build_processes():
     """Find and terminate processes that might be using build directories"""
     logger.info("🔍 Searching for processes that might interfere with build...")
     
     target_processes = []
-    build_dirs = ['build', 'dist']
     
-    for proc in psutil.process_iter(['pid', 'name', 'exe', 'cmdline', 'cwd']):
+    # Computed once instead of per process and per build dir; normcase
+    # makes the comparisons case-insensitive only where the OS is
+    workspace = os.path.normcase(os.getcwd())
+    # Trailing separator so only paths inside the directory match, not build2/
+    build_paths = [(build_dir, os.path.join(workspace, build_dir, '')) for build_dir in BUILD_DIRS]
+    workspace_bytes = os.fsencode(workspace)
+    
+    for proc in psutil.process_iter():
         try:
-            proc_info = proc.info
-            should_kill = False
-            reason = ""
-            
-            # Check if process is GameTimeLimiter
-            if proc_info['name'] and 'GameTimeLimiter' in proc_info['name']:
-                should_kill = True
-                reason = "GameTimeLimiter executable"
-            
-            # Check if process executable is in build directories
-            if proc_info['exe']:
-                for build_dir in build_dirs:
-                    if build_dir in proc_info['exe'] and os.getcwd().lower() in proc_info['exe'].lower():
-                        should_kill = True
-                        reason = f"executable in {build_dir} directory"
-                        break
-            
-            # Check if process working directory is in build directories
-            try:
-                if proc_info['cwd']:
-                    for build_dir in build_dirs:
-                        build_path = os.path.join(os.getcwd(), build_dir)
-                        if build_path.lower() in proc_info['cwd'].lower():
-                            should_kill = True
-                            reason = f"working directory in {build_dir}"
-                            break
-            except (psutil.AccessDenied, psutil.NoSuchProcess):
-                pass
-            
-            # Check command line for build directory references
-            if proc_info['cmdline']:
-                cmdline = ' '.join(proc_info['cmdline'])
-                for build_dir in build_dirs:
-                    if build_dir in cmdline and os.getcwd().lower() in cmdline.lower():
-                        should_kill = True
-                        reason = f"command line references {build_dir}"
-                        break
-            
-            if should_kill:
-                target_processes.append((proc, reason))
-                
+            name = _get_attr(proc.name)
+            reason = _kill_reason(proc, name, workspace_bytes, build_paths)
+            if reason:
+                target_processes.append((proc, name, reason))
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             continue
     
@@ -75,33 +114,30 @@ def find_and_kill_build_processes():
         logger.info("✅ No interfering processes found")
         return 0
     
-    logger.info(f"🎯 Found {len(target_processes)} processes to terminate:")
-    for proc, reason in target_processes:
-        logger.info(f"   - {proc.info['name']} (PID: {proc.info['pid']}) - {reason}")
+    # One multi-line record instead of one log call per process
+    if logger.isEnabledFor(logging.INFO):
+        lines = [f"🎯 Found {len(target_processes)} processes to terminate:"]
+        lines.extend(f"   - {name} (PID: {proc.pid}) - {reason}"
+                     for proc, name, reason in target_processes)
+        logger.info('\n'.join(lines))
     
     # Terminate processes
-    terminated_count = 0
-    for proc, reason in target_processes:
+    terminated = []
+    for proc, name, reason in target_processes:
         try:
-            logger.info(f"🔪 Terminating {proc.info['name']} (PID: {proc.info['pid']})")
+            logger.info("🔪 Terminating %s (PID: %s)", name, proc.pid)
             proc.terminate()
-            terminated_count += 1
+            terminated.append(proc)
         except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-            logger.warning(f"⚠️ Could not terminate {proc.info['name']}: {e}")
+            logger.warning("⚠️ Could not terminate %s: %s", name, e)
+    terminated_count = len(terminated)
     
     if terminated_count > 0:
         logger.info(f"⏳ Waiting for {terminated_count} processes to terminate...")
-        time.sleep(3)
-        
-        # Check if any processes are still running and force kill if necessary
-        still_running = []
-        for proc, reason in target_processes:
-            try:
-                if proc.is_running():
-                    still_running.append(proc)
-            except psutil.NoSuchProcess:
-                pass
+        # Returns as soon as every process has exited instead of always sleeping
+        _, still_running = psutil.wait_procs(terminated, timeout=3)
         
+        # Force kill anything that did not exit in time
         if still_running:
             logger.warning(f"💀 Force killing {len(still_running)} stubborn processes...")
             for proc in still_running:
@@ -109,45 +145,34 @@ def find_and_kill_build_processes():
                     proc.kill()
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     pass
-            time.sleep(1)
+            psutil.wait_procs(still_running, timeout=1)
     
     return terminated_count
 
 def safe_remove_directory(path, max_retries=3):
     """Safely remove a directory with retries"""
-    if not os.path.exists(path):
-        logger.info(f"📁 Directory {path} does not exist, skipping")
-        return True
-    
     logger.info(f"🗑️ Removing directory: {path}")
     
+    # Native tools are much faster than shutil.rmtree on large trees;
+    # fall back to the Python retry loop if anything is left behind
+    if fast_rmtree(path):
+        logger.info(f"✅ Successfully removed {path}")
+        return True
+    
     for attempt in range(max_retries):
         try:
-            shutil.rmtree(path)
+            rmtree(path)
             logger.info(f"✅ Successfully removed {path}")
             return True
             
+        except FileNotFoundError:
+            logger.info(f"📁 Directory {path} no longer exists")
+            return True
+            
         except PermissionError as e:
             logger.warning(f"⚠️ Attempt {attempt + 1}/{max_retries}: Permission denied - {e}")
             
             if attempt < max_retries - 1:
-                # Try to change permissions
-                try:
-                    logger.info("🔧 Attempting to fix permissions...")
-                    for root, dirs, files in os.walk(path):
-                        for file in files:
-                            try:
-                                os.chmod(os.path.join(root, file), 0o777)
-                            except:
-                                pass
-                        for dir in dirs:
-                            try:
-                                os.chmod(os.path.join(root, dir), 0o777)
-                            except:
-                                pass
-                except Exception as perm_e:
-                    logger.warning(f"Could not fix permissions: {perm_e}")
-                
                 wait_time = 2 * (attempt + 1)
                 logger.info(f"⏳ Waiting {wait_time} seconds before retry...")
                 time.sleep(wait_time)
@@ -167,11 +192,27 @@ def cleanup_build_directories():
     """Clean up build and dist directories"""
     logger.info("🧹 Cleaning up build directories...")
     
-    directories = ['build', 'dist']
     success = True
     
-    for directory in directories:
-        if not safe_remove_directory(directory):
+    # One scan of the working directory instead of a stat per directory
+    with os.scandir('.') as it:
+        existing = {os.path.normcase(entry.name) for entry in it if entry.is_dir()}
+    directories = []
+    for directory in BUILD_DIRS:
+        if os.path.normcase(directory) in existing:
+            directories.append(directory)
+        else:
+            logger.info(f"📁 Directory {directory} does not exist, skipping")
+            logger.info(f"✅ {directory} directory cleaned")
+    if not directories:
+        return success
+    
+    # build and dist are independent trees, remove them concurrently
+    with ThreadPoolExecutor(max_workers=len(directories)) as executor:
+        results = list(executor.map(safe_remove_directory, directories))
+    
+    for directory, removed in zip(directories, results):
+        if not removed:
             success = False
             logger.error(f"❌ Failed to remove {directory}")
         else:
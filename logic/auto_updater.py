@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import json
 import shutil
@@ -7,6 +8,9 @@ import subprocess
 import logging
 import asyncio
 import zipfile
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple
@@ -65,18 +69,97 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 下载时每次读取的块大小，以及进度信号的最小间隔（秒）
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+PROGRESS_EMIT_INTERVAL = 0.25
+
+# 检查更新和下载共用一个HTTP会话，复用到GitHub的TCP/TLS连接
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """获取共享的HTTP会话，首次调用时创建"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.headers.update({'User-Agent': 'GameTimeLimiter-AutoUpdater/1.0'})
+            session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+            _http_session = session
+        return _http_session
+
+
+def close_http_session():
+    """关闭共享的HTTP会话"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+
+# Windows版本的发布资源：exe安装包，或文件名中带windows的zip包
+_WIN_ASSET_RE = re.compile(r"\.exe$|windows.*\.zip$", re.IGNORECASE)
+
+# 更新文件的下载目录，每次下载前清空，安装脚本完成后删除
+UPDATE_DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "gamecontrol_update")
+
+# 更新设置文件，保存上次检查时间和GitHub API的ETag缓存
+UPDATE_SETTINGS_FILE = "update_settings.json"
+
+# 连续多次没有更新时逐步拉长检查间隔，最多翻32倍，且不超过一周
+MAX_CHECK_BACKOFF_EXPONENT = 5
+MAX_CHECK_INTERVAL = 7 * 24 * 60 * 60
+
+# 定时检查的最短延迟，以及检查失败后的重试延迟（秒）
+MIN_CHECK_DELAY = 60
+CHECK_RETRY_DELAY = 60 * 60
+
+
+def load_update_settings() -> Dict[str, Any]:
+    """读取更新设置，文件不存在或损坏时返回空字典"""
+    try:
+        with open(UPDATE_SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"读取更新设置失败: {e}")
+        return {}
+
+
+def save_update_settings(updates: Dict[str, Any]):
+    """把updates合并进更新设置文件，保留其他字段
+    
+    先写临时文件再替换，避免写到一半崩溃损坏设置。
+    """
+    data = load_update_settings()
+    data.update(updates)
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode('utf-8')
+    
+    tmp_file = UPDATE_SETTINGS_FILE + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_file, UPDATE_SETTINGS_FILE)
+
 
 class UpdateInfo:
     """更新信息类"""
     
     def __init__(self, version: str, download_url: str, release_notes: str, 
-                 published_at: str, asset_name: str, asset_size: int):
+                 published_at: str, asset_name: str, asset_size: int,
+                 sha256: Optional[str] = None, checksum_url: Optional[str] = None):
         self.version = version
         self.download_url = download_url
         self.release_notes = release_notes
         self.published_at = published_at
         self.asset_name = asset_name
         self.asset_size = asset_size
+        # 预期的SHA-256（十六进制），或者发布中.sha256校验文件的下载地址
+        self.sha256 = sha256
+        self.checksum_url = checksum_url
     
     def __str__(self):
         return f"UpdateInfo(version={self.version}, size={self.asset_size})"
@@ -93,6 +176,8 @@ class UpdateChecker(QObject):
     def __init__(self):
         super().__init__()
         self.client = None
+        # 待写入更新设置的ETag缓存，与检查时间一起保存
+        self.pending_settings: Dict[str, Any] = {}
     
     async def check_for_updates(self) -> Optional[UpdateInfo]:
         """检查是否有可用更新
@@ -116,16 +201,28 @@ class UpdateChecker(QObject):
                 max_retries = 3
                 retry_delay = 2  # 秒
                 
+                # 带上次的ETag发送条件请求，未变化时GitHub返回304且没有响应体
+                settings = load_update_settings()
+                cached_etag = settings.get("latest_etag")
+                cached_payload = settings.get("latest_payload")
+                headers = {}
+                if cached_etag and cached_payload:
+                    headers["If-None-Match"] = cached_etag
+                
                 for attempt in range(max_retries):
                     try:
                         logger.info(f"🌐 请求GitHub API... (尝试 {attempt + 1}/{max_retries})")
-                        response = requests.get(
+                        response = get_http_session().get(
                             f"{GITHUB_RELEASES_URL}/latest",
-                            timeout=30,
-                            headers={'User-Agent': 'GameTimeLimiter-AutoUpdater/1.0'}
+                            headers=headers,
+                            timeout=30
                         )
                         logger.info(f"📡 API响应状态: {response.status_code}")
                         
+                        if response.status_code == 304:
+                            logger.info("♻️ 发布信息未变化，使用缓存的数据")
+                            return cached_payload
+                        
                         # 检查是否是临时错误（5xx）
                         if response.status_code >= 500:
                             if attempt < max_retries - 1:
@@ -135,7 +232,15 @@ class UpdateChecker(QObject):
                                 continue
                         
                         response.raise_for_status()
-                        return response.json()
+                        release_data = response.json()
+                        
+                        etag = response.headers.get("ETag")
+                        if etag:
+                            self.pending_settings = {
+                                "latest_etag": etag,
+                                "latest_payload": release_data
+                            }
+                        return release_data
                         
                     except requests.exceptions.Timeout as e:
                         if attempt < max_retries - 1:
@@ -177,21 +282,24 @@ class UpdateChecker(QObject):
             
             # 查找Windows可执行文件
             logger.info("🔍 查找Windows版本资源...")
-            windows_asset = None
-            for i, asset in enumerate(release_data["assets"]):
-                asset_name = asset["name"].lower()
-                logger.info(f"   资源 {i+1}: {asset['name']} ({asset['size']:,} 字节)")
-                
-                if (asset_name.endswith(".exe") or 
-                    asset_name.endswith(".zip") and "windows" in asset_name):
-                    windows_asset = asset
-                    logger.info(f"✅ 找到Windows资源: {asset['name']}")
-                    break
+            windows_asset = next((a for a in release_data["assets"]
+                                  if _WIN_ASSET_RE.search(a["name"])), None)
             
-            if not windows_asset:
+            if windows_asset:
+                logger.info(f"✅ 找到Windows资源: {windows_asset['name']} ({windows_asset['size']:,} 字节)")
+            else:
                 logger.warning("⚠️ 未找到Windows版本的下载文件")
                 return None
             
+            # 查找校验值：优先使用GitHub提供的digest字段，其次是同名的.sha256资源
+            sha256 = None
+            digest = windows_asset.get("digest") or ""
+            if digest.lower().startswith("sha256:"):
+                sha256 = digest.split(":", 1)[1].lower()
+            checksum_name = windows_asset["name"].lower() + ".sha256"
+            checksum_url = next((a["browser_download_url"] for a in release_data["assets"]
+                                 if a["name"].lower() == checksum_name), None)
+            
             # 创建更新信息
             update_info = UpdateInfo(
                 version=latest_version,
@@ -199,7 +307,9 @@ class UpdateChecker(QObject):
                 release_notes=release_data.get("body", ""),
                 published_at=release_data["published_at"],
                 asset_name=windows_asset["name"],
-                asset_size=windows_asset["size"]
+                asset_size=windows_asset["size"],
+                sha256=sha256,
+                checksum_url=checksum_url
             )
             
             logger.info(f"📦 更新信息创建成功:")
@@ -263,6 +373,10 @@ class UpdateDownloader(QObject):
         """取消下载"""
         self.cancelled = True
     
+    def reset_cancel(self):
+        """清除取消标志，需在启动下载线程之前调用"""
+        self.cancelled = False
+    
     def _emit_progress(self, downloaded, total):
         """发送进度信号的辅助方法"""
         self.download_progress.emit(downloaded, total)
@@ -279,9 +393,10 @@ class UpdateDownloader(QObject):
         try:
             logger.info(f"开始下载更新: {update_info.asset_name}")
             
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="gamecontrol_update_")
-            download_path = os.path.join(temp_dir, update_info.asset_name)
+            # 使用固定的下载目录，先清掉上次残留的文件
+            shutil.rmtree(UPDATE_DOWNLOAD_DIR, ignore_errors=True)
+            os.makedirs(UPDATE_DOWNLOAD_DIR, exist_ok=True)
+            download_path = os.path.join(UPDATE_DOWNLOAD_DIR, update_info.asset_name)
             
             # 使用requests进行下载，它对重定向处理更好
             logger.info("使用requests库进行下载以更好地处理重定向...")
@@ -292,50 +407,70 @@ class UpdateDownloader(QObject):
             
             def sync_download():
                 """同步下载函数"""
-                with requests.Session() as session:
-                    session.headers.update({
-                        'User-Agent': 'GameTimeLimiter-AutoUpdater/1.0'
-                    })
-                    
-                    # 开始下载
-                    response = session.get(
-                        update_info.download_url, 
-                        stream=True,
-                        timeout=UPDATE_DOWNLOAD_TIMEOUT,
-                        allow_redirects=True
-                    )
+                session = get_http_session()
+                
+                expected_sha256 = update_info.sha256
+                if not expected_sha256 and update_info.checksum_url:
+                    # 校验文件格式为 "<hex>  <文件名>"，只取第一段
+                    checksum_response = session.get(update_info.checksum_url, timeout=30)
+                    checksum_response.raise_for_status()
+                    expected_sha256 = checksum_response.text.split()[0].lower()
+                
+                # 开始下载
+                with session.get(
+                    update_info.download_url, 
+                    stream=True,
+                    timeout=UPDATE_DOWNLOAD_TIMEOUT,
+                    allow_redirects=True
+                ) as response:
                     response.raise_for_status()
                     
                     total_size = int(response.headers.get('content-length', 0))
                     downloaded_size = 0
                     logger.info(f"📏 开始下载，总大小: {total_size:,} 字节")
                     
+                    # 直接从底层urllib3响应读取，省去iter_content的生成器包装
+                    raw = response.raw
+                    raw.decode_content = True
+                    
+                    # 边下载边计算SHA-256，不需要再读一遍文件
+                    hasher = hashlib.sha256()
+                    
                     with open(download_path, 'wb') as f:
-                        chunk_count = 0
-                        for chunk in response.iter_content(chunk_size=8192):
+                        last_emit_time = time.monotonic()
+                        while chunk := raw.read(DOWNLOAD_CHUNK_SIZE):
                             if self.cancelled:
                                 logger.info("下载被用户取消")
                                 raise Exception("下载被用户取消")
                             
-                            if chunk:  # 过滤掉保持连接的chunk
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                chunk_count += 1
-                                
-                                # 每10个chunk更新一次进度，减少信号发送频率
-                                if chunk_count % 10 == 0 or downloaded_size >= total_size:
-                                    # 直接发送信号，Qt会自动处理线程安全
-                                    try:
-                                        percentage = int((downloaded_size / total_size) * 100) if total_size > 0 else 0
-                                        logger.info(f"📊 下载进度: {downloaded_size:,}/{total_size:,} 字节 ({percentage}%)")
-                                        self.download_progress.emit(downloaded_size, total_size)
-                                    except Exception as e:
-                                        logger.warning(f"发送进度信号失败: {e}")
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            downloaded_size += len(chunk)
+                            
+                            # 最多每250ms更新一次进度，减少跨线程信号
+                            now = time.monotonic()
+                            if now - last_emit_time >= PROGRESS_EMIT_INTERVAL:
+                                last_emit_time = now
+                                # 直接发送信号，Qt会自动处理线程安全
+                                try:
+                                    percentage = int((downloaded_size / total_size) * 100) if total_size > 0 else 0
+                                    logger.info(f"📊 下载进度: {downloaded_size:,}/{total_size:,} 字节 ({percentage}%)")
+                                    self.download_progress.emit(downloaded_size, total_size)
+                                except Exception as e:
+                                    logger.warning(f"发送进度信号失败: {e}")
                         
                         # 确保最终进度为100%
                         if downloaded_size > 0:
                             self.download_progress.emit(downloaded_size, total_size)
                     
+                    actual_sha256 = hasher.hexdigest()
+                    if expected_sha256:
+                        if actual_sha256 != expected_sha256:
+                            raise Exception(f"文件校验失败，SHA-256不匹配: 期望 {expected_sha256}，实际 {actual_sha256}")
+                        logger.info(f"✅ SHA-256校验通过: {actual_sha256}")
+                    else:
+                        logger.warning(f"⚠️ 发布未提供校验值，跳过SHA-256校验（{actual_sha256}）")
+                    
                     return download_path
             
             # 在线程池中运行下载
@@ -350,33 +485,21 @@ class UpdateDownloader(QObject):
             error_msg = f"HTTP错误: {e}"
             logger.error(error_msg)
             
-            # 清理临时文件
-            if 'download_path' in locals() and os.path.exists(download_path):
-                try:
-                    os.remove(download_path)
-                except:
-                    pass
+            # 清理下载目录
+            shutil.rmtree(UPDATE_DOWNLOAD_DIR, ignore_errors=True)
             raise Exception(error_msg)
         except requests.RequestException as e:
             error_msg = f"网络请求错误: {e}"
             logger.error(error_msg)
             
-            # 清理临时文件
-            if 'download_path' in locals() and os.path.exists(download_path):
-                try:
-                    os.remove(download_path)
-                except:
-                    pass
+            # 清理下载目录
+            shutil.rmtree(UPDATE_DOWNLOAD_DIR, ignore_errors=True)
             raise Exception(error_msg)
         except Exception as e:
             error_msg = f"下载失败: {e}"
             logger.error(error_msg)
-            # 清理临时文件
-            if 'download_path' in locals() and os.path.exists(download_path):
-                try:
-                    os.remove(download_path)
-                except:
-                    pass
+            # 清理下载目录
+            shutil.rmtree(UPDATE_DOWNLOAD_DIR, ignore_errors=True)
             raise Exception(error_msg)
     
     async def close(self):
@@ -412,51 +535,72 @@ class AutoUpdater(QObject):
         # 任务状态跟踪
         self._check_task_id = None
         self._download_task_id = None
+        # 正在运行的后台线程，关闭时取消并等待它们结束
+        self._active_threads: set = set()
+        self._active_threads_lock = threading.Lock()
+        
+        # 下载进度显示的缓存，每次下载开始时重置
+        self._last_progress_pct = -1
+        self._total_mb_str: Optional[str] = None
         
         # 添加手动检查标志
         self._is_manual_check = False
         
         # 加载上次检查时间
+        self.consecutive_no_update = 0
         self.last_check_time = self.load_last_check_time()
         
+        # 用单调时钟记录上次检查，定时器触发时无需再做datetime运算
+        self._last_check_monotonic: Optional[float] = None
+        if self.last_check_time:
+            elapsed = max(0.0, (datetime.now() - self.last_check_time).total_seconds())
+            self._last_check_monotonic = time.monotonic() - elapsed
+        
         # 设置定时检查
+        # 设置定时检查：单次定时器，每次检查结束后按下次检查时间重新安排
         self.check_timer = QTimer()
+        self.check_timer.setSingleShot(True)
         self.check_timer.timeout.connect(self.check_for_updates_if_needed)
-        self.check_timer.start(60 * 60 * 1000)  # 每小时检查一次
+        self._schedule_next_check()
     
-    def load_last_check_time(self):
+    def load_last_check_time(self) -> Optional[datetime]:
         """加载上次检查时间"""
         try:
-            settings_file = "update_settings.json"
-            if os.path.exists(settings_file):
-                with open(settings_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    last_check_str = data.get("last_check_time")
-                    if last_check_str:
-                        self.last_check_time = datetime.fromisoformat(last_check_str)
+            data = load_update_settings()
+            self.consecutive_no_update = int(data.get("consecutive_no_update", 0))
+            last_check_str = data.get("last_check_time")
+            if last_check_str:
+                return datetime.fromisoformat(last_check_str)
         except Exception as e:
             logger.warning(f"加载上次检查时间失败: {e}")
+        return None
     
     def save_last_check_time(self):
         """保存上次检查时间"""
         try:
-            settings_file = "update_settings.json"
-            data = {
+            # 检查器缓存的ETag与检查时间合并为一次写入
+            updates = self.checker.pending_settings
+            self.checker.pending_settings = {}
+            updates.update({
                 "last_check_time": datetime.now().isoformat(),
-                "current_version": get_current_version()
-            }
-            with open(settings_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+                "current_version": get_current_version(),
+                "consecutive_no_update": self.consecutive_no_update
+            })
+            save_update_settings(updates)
         except Exception as e:
             logger.warning(f"保存检查时间失败: {e}")
     
     def should_check_for_updates(self) -> bool:
         """检查是否应该检查更新"""
-        if not self.last_check_time:
+        if self._last_check_monotonic is None:
             return True
         
-        time_since_last_check = datetime.now() - self.last_check_time
-        return time_since_last_check.total_seconds() >= UPDATE_CHECK_INTERVAL
+        return time.monotonic() - self._last_check_monotonic >= self.get_check_interval()
+    
+    def get_check_interval(self) -> int:
+        """根据连续无更新的次数计算检查间隔（秒）"""
+        backoff = 2 ** min(self.consecutive_no_update, MAX_CHECK_BACKOFF_EXPONENT)
+        return min(UPDATE_CHECK_INTERVAL * backoff, MAX_CHECK_INTERVAL)
     
     def can_update_now(self) -> Tuple[bool, str]:
         """检查当前是否可以进行更新
@@ -477,10 +621,21 @@ class AutoUpdater(QObject):
         
         return True, ""
     
+    def _schedule_next_check(self, min_delay: int = MIN_CHECK_DELAY):
+        """安排下一次定时检查，必须在主线程调用"""
+        delay_s = 0
+        if self._last_check_monotonic is not None:
+            delay_s = self.get_check_interval() - (time.monotonic() - self._last_check_monotonic)
+        delay_s = max(min_delay, delay_s)
+        self.check_timer.start(int(delay_s * 1000))
+        logger.info(f"⏰ 下次自动检查更新将在 {delay_s / 3600:.1f} 小时后")
+    
     def check_for_updates_if_needed(self):
         """如果需要，检查更新"""
         if self.should_check_for_updates():
             self.check_for_updates()
+        else:
+            self._schedule_next_check()
     
     def check_for_updates(self, manual=False):
         """检查更新（异步）
@@ -539,13 +694,11 @@ class AutoUpdater(QObject):
                     
                 except Exception as e:
                     logger.error(f"线程中检查更新失败: {e}")
-                    # 在主线程中发送错误信号
-                    from PyQt6.QtCore import QTimer
-                    QTimer.singleShot(0, lambda: self.update_check_failed.emit(str(e)))
+                    # 通过checker信号排队到主线程处理
+                    self.checker.check_failed.emit(str(e))
             
             # 在后台线程中运行
-            thread = threading.Thread(target=run_check, daemon=True)
-            thread.start()
+            self._start_worker_thread(run_check)
             
             self._check_task_id = "update_check"
             logger.info(f"✅ 更新检查任务已创建: {self._check_task_id}")
@@ -561,10 +714,25 @@ class AutoUpdater(QObject):
             logger.error(f"❌ 创建更新检查任务失败: {e}")
             self._handle_check_error(e)
     
+    def _start_worker_thread(self, target):
+        """启动后台线程并记录，线程结束时自动移除"""
+        def run():
+            try:
+                target()
+            finally:
+                with self._active_threads_lock:
+                    self._active_threads.discard(thread)
+        
+        thread = threading.Thread(target=run, daemon=True)
+        with self._active_threads_lock:
+            self._active_threads.add(thread)
+        thread.start()
+        return thread
+    
     def _handle_check_error(self, error):
         """处理检查错误"""
         logger.error(f"❌ 更新检查任务失败: {error}")
-        self.update_check_failed.emit(str(error))
+        self.on_check_failed(str(error))
     
     async def _async_check_for_updates(self):
         """异步检查更新"""
@@ -577,8 +745,12 @@ class AutoUpdater(QObject):
             update_info = await self.checker.check_for_updates()
             logger.info("✅ 更新检查完成")
             
+            # 有新版本时恢复正常间隔，否则累计无更新次数
+            self.consecutive_no_update = 0 if update_info else self.consecutive_no_update + 1
+            
             # 保存检查时间
             self.last_check_time = datetime.now()
+            self._last_check_monotonic = time.monotonic()
             self.save_last_check_time()
             logger.info(f"💾 保存检查时间: {self.last_check_time}")
             
@@ -614,9 +786,8 @@ class AutoUpdater(QObject):
                 
         except Exception as e:
             logger.error(f"❌ 异步检查更新失败: {e}", exc_info=True)
-            # 在主线程中发送信号
-            from PyQt6.QtCore import QTimer
-            QTimer.singleShot(0, lambda: self.update_check_failed.emit(str(e)))
+            # 通过checker信号排队到主线程处理
+            self.checker.check_failed.emit(str(e))
     
     def on_update_available(self, update_info: UpdateInfo):
         """处理发现更新"""
@@ -641,6 +812,8 @@ class AutoUpdater(QObject):
             logger.error(f"❌ 发送update_available信号失败: {e}")
         
         # 不再自动显示更新对话框，由主窗口控制
+        
+        self._schedule_next_check()
     
     def on_no_update_available(self):
         """处理无更新可用"""
@@ -679,11 +852,15 @@ class AutoUpdater(QObject):
         
         # 发送信号给主窗口
         self.no_update_available.emit()
+        
+        self._schedule_next_check()
     
     def on_check_failed(self, error_msg: str):
         """处理检查失败"""
         logger.error(f"检查更新失败: {error_msg}")
         self.update_check_failed.emit(error_msg)
+        
+        self._schedule_next_check(CHECK_RETRY_DELAY)
     
     def show_update_dialog(self, update_info: UpdateInfo):
         """显示更新对话框"""
@@ -792,6 +969,13 @@ class AutoUpdater(QObject):
                 )
                 return
             
+            # 清除上次的取消标志，必须在下载线程启动前完成，避免丢失之后的取消请求
+            self.downloader.reset_cancel()
+            
+            # 重置进度显示的缓存
+            self._last_progress_pct = -1
+            self._total_mb_str = None
+            
             # 创建进度对话框
             progress_dialog = QProgressDialog(
                 "正在下载更新...", "取消", 0, 100, self.parent
@@ -838,8 +1022,7 @@ class AutoUpdater(QObject):
                         QTimer.singleShot(0, lambda: self.downloader.download_failed.emit(str(e)))
                 
                 # 在后台线程中运行
-                thread = threading.Thread(target=run_download, daemon=True)
-                thread.start()
+                self._start_worker_thread(run_download)
                 
                 self._download_task_id = "update_download"
                 logger.info(f"✅ 下载任务已创建: {self._download_task_id}")
@@ -895,19 +1078,24 @@ class AutoUpdater(QObject):
     
     def update_download_progress(self, progress_dialog, downloaded, total):
         """更新下载进度"""
-        logger.info(f"🔄 update_download_progress被调用: {downloaded:,}/{total:,} 字节")
-        
         if total > 0:
-            percentage = int((downloaded / total) * 100)
-            logger.info(f"📊 设置进度条值: {percentage}%")
+            percentage = downloaded * 100 // total
+            # 百分比没有变化时不刷新对话框
+            if percentage == self._last_progress_pct:
+                return
+            self._last_progress_pct = percentage
+            
+            if self._total_mb_str is None:
+                self._total_mb_str = f"{total / (1024 * 1024):.1f}"
+            
+            logger.info(f"📊 下载进度: {downloaded:,}/{total:,} 字节 ({percentage}%)")
             progress_dialog.setValue(percentage)
             
             # 更新标签文本
             downloaded_mb = downloaded / (1024 * 1024)
-            total_mb = total / (1024 * 1024)
-            label_text = f"正在下载更新... {downloaded_mb:.1f}/{total_mb:.1f} MB ({percentage}%)"
-            logger.info(f"📝 设置标签文本: {label_text}")
-            progress_dialog.setLabelText(label_text)
+            progress_dialog.setLabelText(
+                f"正在下载更新... {downloaded_mb:.1f}/{self._total_mb_str} MB ({percentage}%)"
+            )
         else:
             logger.warning("⚠️ total_size为0，无法计算进度")
     
@@ -1096,28 +1284,28 @@ class AutoUpdater(QObject):
             backup_path = os.path.join(backup_dir, backup_name)
             logger.info(f"📝 备份文件名: {backup_name}")
             
-            # 检查源文件是否存在
-            if not os.path.exists(current_exe):
+            # 检查源文件是否存在并获取大小，一次stat完成
+            try:
+                source_size = os.stat(current_exe).st_size
+            except FileNotFoundError:
                 raise Exception(f"源文件不存在: {current_exe}")
-            
-            # 获取源文件大小
-            source_size = os.path.getsize(current_exe)
             logger.info(f"📏 源文件大小: {source_size:,} 字节")
             
-            # 执行备份
-            shutil.copy2(current_exe, backup_path)
+            # 执行备份：copyfile走系统的快速复制（Windows上为CopyFile2，Linux上为sendfile）
+            shutil.copyfile(current_exe, backup_path)
+            shutil.copystat(current_exe, backup_path)
             
             # 验证备份文件
-            if os.path.exists(backup_path):
-                backup_size = os.path.getsize(backup_path)
-                logger.info(f"✅ 备份完成，备份文件大小: {backup_size:,} 字节")
-                
-                if backup_size != source_size:
-                    logger.warning(f"⚠️ 备份文件大小与源文件不匹配: {backup_size} != {source_size}")
-                else:
-                    logger.info("✅ 备份文件大小验证通过")
-            else:
+            try:
+                backup_size = os.stat(backup_path).st_size
+            except FileNotFoundError:
                 raise Exception("备份文件创建失败")
+            logger.info(f"✅ 备份完成，备份文件大小: {backup_size:,} 字节")
+            
+            if backup_size != source_size:
+                logger.warning(f"⚠️ 备份文件大小与源文件不匹配: {backup_size} != {source_size}")
+            else:
+                logger.info("✅ 备份文件大小验证通过")
             
             return backup_path
             
@@ -1149,6 +1337,7 @@ class AutoUpdater(QObject):
         current_dir = current_dir.replace('/', '\\')
         if backup_path:
             backup_path = backup_path.replace('/', '\\')
+        update_dir = UPDATE_DOWNLOAD_DIR.replace('/', '\\')
         
         # 构建脚本内容
         log_file = os.path.join(current_dir, "update_script.log").replace('/', '\\')
@@ -1304,6 +1493,7 @@ if not exist "{current_exe}" (
 REM Clean up temporary files
 echo Cleaning up temporary files...
 del /q "{update_file}" 2>nul
+rmdir /s /q "{update_dir}" 2>nul
 
 echo Update completed successfully!
 echo Restarting application...
@@ -1421,9 +1611,22 @@ del /q "%~f0" 2>nul
                 logger.info("清理下载任务状态")
                 self._download_task_id = None
             
+            # 取消正在进行的下载，并等待后台线程结束后再关闭HTTP会话
+            self.downloader.cancel_download()
+            with self._active_threads_lock:
+                threads = list(self._active_threads)
+            if threads:
+                logger.info(f"等待 {len(threads)} 个后台任务结束...")
+                loop = asyncio.get_event_loop()
+                await asyncio.gather(
+                    *(loop.run_in_executor(None, t.join, 3) for t in threads),
+                    return_exceptions=True
+                )
+            
             # 关闭组件
             await self.checker.close()
             await self.downloader.close()
+            close_http_session()
             
             logger.info("自动更新器已关闭")
             
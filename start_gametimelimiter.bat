@@ -6,8 +6,19 @@ cd /d "%~dp0"
 
 REM Clean up any temporary PyInstaller files
 echo Cleaning temporary files...
-for /d %%d in ("%TEMP%\_MEI*") do rmdir /s /q "%%d" 2>nul
-for /d %%d in ("%LOCALAPPDATA%\Temp\_MEI*") do rmdir /s /q "%%d" 2>nul
+REM With PowerShell 7 delete the leftover folders in parallel, otherwise one by one
+set "MEI_CLEANED="
+if exist "%TEMP%\_MEI*" where pwsh >nul 2>&1 && (
+    pwsh -NoProfile -NonInteractive -Command "Get-ChildItem -Path $env:TEMP, ($env:LOCALAPPDATA + '\Temp') -Directory -Filter '_MEI*' -ErrorAction SilentlyContinue | Select-Object -ExpandProperty FullName -Unique | ForEach-Object -Parallel { Remove-Item -LiteralPath $_ -Recurse -Force -ErrorAction SilentlyContinue } -ThrottleLimit 8"
+    set "MEI_CLEANED=1"
+)
+if not defined MEI_CLEANED (
+    for /d %%d in ("%TEMP%\_MEI*") do rmdir /s /q "%%d" 2>nul
+    REM %LOCALAPPDATA%\Temp is normally the same folder as %TEMP%, only scan it when it differs
+    if defined LOCALAPPDATA if /i not "%LOCALAPPDATA%\Temp"=="%TEMP%" (
+        for /d %%d in ("%LOCALAPPDATA%\Temp\_MEI*") do rmdir /s /q "%%d" 2>nul
+    )
+)
 
 REM Start the application
 echo Starting application...
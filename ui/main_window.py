@@ -867,7 +867,14 @@ class MainWindow(QMainWindow):
             if hasattr(self, 'auto_updater') and self.auto_updater:
                 try:
                     logger.info("清理自动更新器...")
-                    asyncio.create_task(self.auto_updater.close())
+                    try:
+                        loop = asyncio.get_running_loop()
+                    except RuntimeError:
+                        # 没有运行中的事件循环时同步执行关闭
+                        asyncio.run(self.auto_updater.close())
+                    else:
+                        # 保留任务引用，避免任务在完成前被回收
+                        self._updater_close_task = loop.create_task(self.auto_updater.close())
                 except Exception as e:
                     logger.error(f"清理自动更新器时出错: {e}")
             